@@ -18,7 +18,10 @@
 """Renku MLS plugin."""
 
 import json
+import os
 import re
+import tempfile
+from pathlib import Path
 from typing import List
 
 import click
@@ -28,7 +31,7 @@ from deepdiff import DeepDiff
 from mlsconverters.io import COMMON_DIR, MLS_DIR
 from prettytable import PrettyTable
 from renku.command.command_builder.command import Command
-from renku.command.graph import get_graph_for_all_objects, update_nested_node_host
+from renku.command.graph import get_graph_for_all_objects, get_graph_for_revision, update_nested_node_host
 from renku.core import errors
 from renku.core.plugin import hookimpl
 from renku.core.util.urls import get_host
@@ -82,9 +85,17 @@ def _run_id(activity_id):
     return str(activity_id).split("/")[-1]
 
 
-def _export_graph():
-    """Get graph from renku."""
-    graph = get_graph_for_all_objects()
+def _export_graph(revisions_or_ranges=None):
+    """Get graph from renku.
+
+    If ``revisions_or_ranges`` is given, only objects changed in those commits are part of the graph.
+    """
+    if revisions_or_ranges:
+        graph = []
+        for revision_or_range in revisions_or_ranges:
+            graph.extend(get_graph_for_revision(revision_or_range=revision_or_range))
+    else:
+        graph = get_graph_for_all_objects()
 
     # NOTE: rewrite ids for current environment
     host = get_host()
@@ -103,7 +114,17 @@ def _conjunctive_graph(graph):
         output = getattr(pyld.jsonld, format)(graph)
         return json.dumps(output, indent=2)
 
-    return rdflib.ConjunctiveGraph().parse(data=to_jsonld(graph, "expand"), format="json-ld")
+    graph = rdflib.ConjunctiveGraph().parse(data=to_jsonld(graph, "expand"), format="json-ld")
+
+    graph.bind("prov", "http://www.w3.org/ns/prov#")
+    graph.bind("foaf", "http://xmlns.com/foaf/0.1/")
+    graph.bind("schema", "http://schema.org/")
+    graph.bind("renku", "https://swissdatasciencecenter.github.io/renku-ontology/")
+    graph.bind("mls", "http://www.w3.org/ns/mls#")
+    graph.bind("oa", "http://www.w3.org/ns/oa#")
+    graph.bind("xsd", "http://www.w3.org/2001/XMLSchema#")
+
+    return graph
 
 
 def _graph(revision, paths):
@@ -113,17 +134,208 @@ def _graph(revision, paths):
     if cmd_result.status == cmd_result.FAILURE:
         raise errors.OperationError("Cannot export Renku graph.")
 
-    graph = _conjunctive_graph(cmd_result.output)
+    return _conjunctive_graph(cmd_result.output)
 
-    graph.bind("prov", "http://www.w3.org/ns/prov#")
-    graph.bind("foaf", "http://xmlns.com/foaf/0.1/")
-    graph.bind("schema", "http://schema.org/")
-    graph.bind("renku", "https://swissdatasciencecenter.github.io/renku-ontology/")
-    graph.bind("mls", "http://www.w3.org/ns/mls#")
-    graph.bind("oa", "http://www.w3.org/ns/oa#")
-    graph.bind("xsd", "http://www.w3.org/2001/XMLSchema#")
 
-    return graph
+def _leaderboard_runs(graph):
+    """Get evaluated runs with their model, inputs and metric from an RDF graph."""
+    runs = dict()
+    for r in graph.query(
+        """SELECT DISTINCT ?type ?value ?run ?runId ?dsPath where {{
+        ?em a mls:ModelEvaluation ;
+        mls:hasValue ?value ;
+        mls:specifiedBy ?type ;
+        ^mls:hasOutput/mls:implements/rdfs:label ?run ;
+        ^mls:hasOutput/^oa:hasBody/oa:hasTarget ?runId ;
+        ^mls:hasOutput/^oa:hasBody/oa:hasTarget/prov:qualifiedUsage/prov:entity/prov:atLocation ?dsPath
+        }}"""
+    ):
+        run_id = _run_id(r.runId)
+        metric_type = r.type.split("#")[1]
+        if run_id in runs:
+            runs[run_id]["inputs"].append(r.dsPath.__str__())
+            continue
+        runs[run_id] = {
+            metric_type: r.value.value,
+            "model": r.run.__str__(),
+            "inputs": [r.dsPath.__str__()],
+        }
+    return runs
+
+
+def _filter_runs(runs, paths):
+    """Keep only runs that used any of ``paths`` as input."""
+    if not len(paths):
+        return runs
+    filtered_runs = dict()
+    for path in paths:
+        filtered_runs.update(dict(filter(lambda x: path in x[1]["inputs"], runs.items())))
+    return filtered_runs
+
+
+def _snapshots_path():
+    """Return a ``Path`` instance of the leaderboard snapshots cache folder."""
+    # NOTE: bump the version whenever the query or the stored fields change
+    return project_context.metadata_path / "cache" / MLS_DIR / "leaderboards" / "v1"
+
+
+def _read_snapshot(path):
+    """Load a cached leaderboard snapshot, ``None`` if there is none."""
+    if not path.exists():
+        return None
+    with path.open() as f:
+        return json.load(f)
+
+
+def _write_snapshot(path, runs):
+    """Store a leaderboard snapshot, atomically as the cache may be shared by concurrent jobs."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False)
+    try:
+        with f:
+            json.dump(runs, f)
+        os.replace(f.name, path)
+    except BaseException:
+        os.unlink(f.name)
+        raise
+
+
+def _export_runs(revisions_or_ranges=None):
+    """Get evaluated runs of the objects changed in ``revisions_or_ranges``, of all objects if not given."""
+    runs = _leaderboard_runs(_conjunctive_graph(_export_graph(revisions_or_ranges)))
+    for v in runs.values():
+        v["inputs"].sort()
+
+    # NOTE: metric values may be ``Decimal`` literals, store them the same way they are read back
+    return json.loads(json.dumps(runs, default=float))
+
+
+def _load_leaderboard_snapshot(revision, snapshots_path):
+    """Get all evaluated runs at a commit that is part of the checked-out history.
+
+    Snapshots are cached per commit. A missing snapshot is built from the closest cached ancestor snapshot and the
+    runs recorded in the commits since then. Without any cached ancestor, all runs are exported and the ones recorded
+    after the commit are dropped.
+
+    NOTE: Runs are only ever added to an ancestor snapshot, runs deleted in the commits since then are kept.
+    """
+    repository = project_context.repository
+    snapshot_path = snapshots_path / "{}.json".format(revision)
+    runs = _read_snapshot(snapshot_path)
+    if runs is not None:
+        return runs
+
+    for ancestor in repository.iterate_commits(revision=revision):
+        runs = _read_snapshot(snapshots_path / "{}.json".format(ancestor.hexsha))
+        if runs is not None:
+            runs.update(_export_runs(["{}..{}".format(ancestor.hexsha, revision)]))
+            break
+    else:
+        # NOTE: renku exports a single revision as the objects changed in that commit only, exporting the history up
+        # to the commit range by range is much slower than exporting all objects once
+        runs = _export_runs()
+        head = repository.head.commit.hexsha
+        if head != revision:
+            for run_id in _export_runs(["{}..{}".format(revision, head)]):
+                runs.pop(run_id, None)
+
+    _write_snapshot(snapshot_path, runs)
+    return runs
+
+
+def _resolve_revisions(revisions):
+    """Get the commits of revisions, their merge base and which of them are part of the checked-out history."""
+    repository = project_context.repository
+    head = repository.head.commit.hexsha
+    commits = [repository.get_commit(revision).hexsha for revision in revisions]
+    merge_base = repository.run_git_command("merge-base", *commits).strip() if len(commits) > 1 else commits[0]
+    checked_out = {
+        commit: repository.run_git_command("merge-base", commit, head).strip() == commit
+        for commit in commits + [merge_base]
+    }
+    return commits, merge_base, checked_out, _snapshots_path()
+
+
+def _add_worktree(revision, path):
+    """Check out a revision in a detached git worktree."""
+    project_context.repository.run_git_command("worktree", "add", "--detach", str(path), revision)
+
+
+def _remove_worktree(path):
+    """Remove a git worktree."""
+    project_context.repository.run_git_command("worktree", "remove", "--force", str(path))
+
+
+def _execute(function, error, database=False, **kwargs):
+    """Execute ``function`` as a renku command."""
+    command = Command().command(function)
+    if database:
+        command = command.with_database(write=False).require_migration()
+    cmd_result = command.build().execute(**kwargs)
+
+    if cmd_result.status == cmd_result.FAILURE:
+        raise errors.OperationError(error)
+
+    return cmd_result.output
+
+
+def _leaderboard_snapshot(revision, checked_out, snapshots_path):
+    """Get all evaluated runs at a commit from the leaderboard snapshots cache.
+
+    Renku loads objects from the checked-out metadata only, commits outside the checked-out history are thus
+    exported from a temporary git worktree.
+    """
+    error = "Cannot create leaderboard snapshot for revision {}.".format(revision)
+    if checked_out:
+        return _execute(
+            _load_leaderboard_snapshot, error, database=True, revision=revision, snapshots_path=snapshots_path
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        worktree = Path(tmp) / "worktree"
+        _execute(_add_worktree, error, revision=revision, path=worktree)
+        try:
+            with project_context.with_path(worktree):
+                return _execute(
+                    _load_leaderboard_snapshot, error, database=True, revision=revision, snapshots_path=snapshots_path
+                )
+        finally:
+            _execute(_remove_worktree, error, path=worktree)
+
+
+def _leaderboard_ranks(runs, metric):
+    """Get the leaderboard position of every run that has ``metric``."""
+    ranked = sorted((run_id for run_id, v in runs.items() if metric in v), key=lambda r: runs[r][metric], reverse=True)
+    return {run_id: rank for rank, run_id in enumerate(ranked, start=1)}
+
+
+def _leaderboard_delta(old_runs, new_runs, metric):
+    """Get the runs added or removed between two leaderboards with their rank changes.
+
+    The delta of an added run is the difference of its metric to the best run of the old leaderboard.
+    """
+    old_ranks = _leaderboard_ranks(old_runs, metric)
+    new_ranks = _leaderboard_ranks(new_runs, metric)
+    best = max((old_runs[run_id][metric] for run_id in old_ranks), default=None)
+    delta = []
+    for run_id in old_ranks.keys() ^ new_ranks.keys():
+        added = run_id in new_ranks
+        run = new_runs[run_id] if added else old_runs[run_id]
+        delta.append(
+            {
+                "run_id": run_id,
+                "status": "added" if added else "removed",
+                "model": run["model"],
+                "inputs": sorted(run["inputs"]),
+                "old_rank": old_ranks.get(run_id),
+                "new_rank": new_ranks.get(run_id),
+                "old_value": None if added else run[metric],
+                "new_value": run[metric] if added else None,
+                "delta": run[metric] - best if added and best is not None else None,
+            }
+        )
+    delta.sort(key=lambda d: (d["new_rank"] or len(new_ranks) + 1, d["old_rank"] or len(old_ranks) + 1))
+    return delta
 
 
 def _create_leaderboard(data, metric, format=None):
@@ -142,6 +354,37 @@ def _create_leaderboard(data, metric, format=None):
     return leaderboard
 
 
+def _create_leaderboard_delta(delta, metric, old_revision, new_revision):
+    """Create a table of leaderboard changes between two revisions."""
+
+    def _or_dash(value):
+        return "-" if value is None else value
+
+    old_column = "{} ({})".format(metric, old_revision)
+    new_column = "{} ({})".format(metric, new_revision)
+    output = PrettyTable()
+    output.field_names = ["Run ID", "Status", "Model", "Inputs", "Rank", old_column, new_column, "Delta"]
+    output.align["Model"] = "l"
+    output.align["Inputs"] = "l"
+    output.align[old_column] = "r"
+    output.align[new_column] = "r"
+    output.align["Delta"] = "r"
+    for d in delta:
+        output.add_row(
+            [
+                d["run_id"],
+                d["status"],
+                d["model"],
+                d["inputs"],
+                "{} -> {}".format(_or_dash(d["old_rank"]), _or_dash(d["new_rank"])),
+                _or_dash(d["old_value"]),
+                _or_dash(d["new_value"]),
+                "-" if d["delta"] is None else "{:+g}".format(d["delta"]),
+            ]
+        )
+    return output
+
+
 @click.group()
 def mls():
     """Click MLSchema plugin commands."""
@@ -151,43 +394,47 @@ def mls():
 @mls.command()
 @click.option(
     "--revision",
-    default="HEAD",
-    help="The git revision to generate the log for, default: HEAD",
+    help="The git revision to generate the log for, default: HEAD. Revisions other than HEAD are read from cached "
+    "snapshots, which may still list runs deleted before that revision.",
 )
 @click.option("--format", default="ascii", help="Choose an output format.")
 @click.option("--metric", default="accuracy", help="Choose metric for the leaderboard")
+@click.option(
+    "--compare",
+    nargs=2,
+    help="Print the runs added or removed between two revisions with their rank changes and the metric delta of "
+    "added runs to the best run of the first revision. Uses the same cached snapshots as --revision.",
+)
 @click.argument("paths", type=click.Path(exists=False), nargs=-1)
-def leaderboard(revision, format, metric, paths):
-    """Leaderboard based on evaluation metrics of machine learning models."""
-    graph = _graph(revision, paths)
-    leaderboard = dict()
-    for r in graph.query(
-        """SELECT DISTINCT ?type ?value ?run ?runId ?dsPath where {{
-        ?em a mls:ModelEvaluation ;
-        mls:hasValue ?value ;
-        mls:specifiedBy ?type ;
-        ^mls:hasOutput/mls:implements/rdfs:label ?run ;
-        ^mls:hasOutput/^oa:hasBody/oa:hasTarget ?runId ;
-        ^mls:hasOutput/^oa:hasBody/oa:hasTarget/prov:qualifiedUsage/prov:entity/prov:atLocation ?dsPath
-        }}"""
-    ):
-        run_id = _run_id(r.runId)
-        metric_type = r.type.split("#")[1]
-        if run_id in leaderboard:
-            leaderboard[run_id]["inputs"].append(r.dsPath.__str__())
-            continue
-        leaderboard[run_id] = {
-            metric_type: r.value.value,
-            "model": r.run,
-            "inputs": [r.dsPath.__str__()],
-        }
-    if len(paths):
-        filtered_board = dict()
-        for path in paths:
-            filtered_board.update(dict(filter(lambda x: path in x[1]["inputs"], leaderboard.items())))
-        print(_create_leaderboard(filtered_board, metric))
+def leaderboard(revision, format, metric, compare, paths):
+    """Leaderboard based on evaluation metrics of machine learning models.
+
+    Leaderboards of revisions other than HEAD are built from per-commit snapshots cached in ``.renku/cache``. Runs are
+    only ever added to these snapshots, so runs deleted after a cached commit may still be listed.
+    """
+    if compare and revision:
+        raise click.UsageError("--revision cannot be used together with --compare.")
+
+    if compare:
+        error = "Cannot resolve revisions {} and {}.".format(*compare)
+        commits, merge_base, checked_out, snapshots_path = _execute(_resolve_revisions, error, revisions=compare)
+        # NOTE: snapshot the merge base first, so both revisions only export the runs recorded since then
+        _leaderboard_snapshot(merge_base, checked_out[merge_base], snapshots_path)
+        old_runs, new_runs = (
+            _filter_runs(_leaderboard_snapshot(commit, checked_out[commit], snapshots_path), paths)
+            for commit in commits
+        )
+        delta = _leaderboard_delta(old_runs, new_runs, metric)
+        print(_create_leaderboard_delta(delta, metric, compare[0], compare[1]))
+        return
+
+    if revision and revision != "HEAD":
+        error = "Cannot resolve revision {}.".format(revision)
+        commits, _, checked_out, snapshots_path = _execute(_resolve_revisions, error, revisions=[revision])
+        runs = _leaderboard_snapshot(commits[0], checked_out[commits[0]], snapshots_path)
     else:
-        print(_create_leaderboard(leaderboard, metric))
+        runs = _leaderboard_runs(_graph(revision, paths))
+    print(_create_leaderboard(_filter_runs(runs, paths), metric))
 
 
 @mls.command()
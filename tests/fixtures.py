@@ -123,20 +123,40 @@ def project_with_script(renku_project):
 
         # model eval
         y_pred = model.predict(X_test)
-        acc = accuracy_score(y_test, y_test)
+        acc = {accuracy}
         export(model, evaluation_measure=(accuracy_score, acc))
     """
     script_file = renku_project / "script.py"
 
-    def _write_script(state: int):
+    def _write_script(state: int, accuracy: Optional[float] = None):
         """Create/update a script file."""
-        script_file.write_text(inspect.cleandoc(script.format(state=42)))
+        accuracy = "accuracy_score(y_test, y_test)" if accuracy is None else accuracy
+        script_file.write_text(inspect.cleandoc(script.format(state=42, accuracy=accuracy)))
         porcelain.add(repo, script_file)
         porcelain.commit(repo, "commit script")
 
     return script_file, _write_script
 
 
+@pytest.fixture()
+def run_script(project_with_script, run_shell):
+    """Record renku runs of the model training script."""
+    script_file, write_script = project_with_script
+    repo = Repo(script_file.parent)
+
+    def _run_script(state: int, accuracy: Optional[float] = None) -> str:
+        """Update the script, run it and return the commit of the run."""
+        write_script(state, accuracy)
+
+        output = run_shell(f"renku run --no-output -- python {str(script_file)}")
+        assert b"" == output[0]
+        assert output[1] is None
+
+        return repo.head().decode()
+
+    return _run_script
+
+
 @pytest.fixture()
 def run_shell():
     """Create a shell cmd runner."""
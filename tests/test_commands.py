@@ -17,9 +17,10 @@
 # limitations under the License.
 """Renku MLS leaderboard tests."""
 
+import pytest
 from click.testing import CliRunner
 
-from renkumls.plugin import leaderboard, params
+from renkumls.plugin import _leaderboard_delta, leaderboard, params
 
 
 def test_leaderboard(project_with_script, run_shell):
@@ -45,6 +46,141 @@ def test_leaderboard(project_with_script, run_shell):
     assert result.output.count("script.py") == 2
 
 
+def _leaderboard_rows(output):
+    """Get the rows of a printed leaderboard by run id."""
+    rows = [[c.strip() for c in line.strip("|").split("|")] for line in output.splitlines() if line.startswith("|")]
+    return {row[0]: row for row in rows[1:]}
+
+
+def _leaderboard_rows_at(revision):
+    """Get the rows of the leaderboard at a revision."""
+    result = CliRunner().invoke(leaderboard, ["--revision", revision], "\n", catch_exceptions=False)
+    assert result.exit_code == 0
+    return _leaderboard_rows(result.output)
+
+
+def _compare_rows(old_revision, new_revision):
+    """Get the rows of the comparison between the leaderboards of two revisions."""
+    result = CliRunner().invoke(leaderboard, ["--compare", old_revision, new_revision], "\n", catch_exceptions=False)
+    assert result.exit_code == 0
+    return _leaderboard_rows(result.output)
+
+
+def test_leaderboard_revision(renku_project, run_script):
+    """Test that a leaderboard at a revision contains the runs of all previous commits."""
+    run_script(42, 0.8)
+    revision = run_script(123, 0.9)
+    run_script(99, 0.95)
+
+    result = CliRunner().invoke(leaderboard, [], "\n", catch_exceptions=False)
+    assert result.exit_code == 0
+    head_rows = _leaderboard_rows(result.output)
+    assert [row[3] for row in head_rows.values()] == ["0.95", "0.9", "0.8"]
+    assert not list(renku_project.glob(".renku/cache/**/leaderboards"))
+
+    rows = _leaderboard_rows_at(revision)
+    assert [row[3] for row in rows.values()] == ["0.9", "0.8"]
+    assert head_rows.keys() > rows.keys()
+
+    result = CliRunner().invoke(leaderboard, ["--revision", "HEAD", "--compare", revision, "HEAD"], "\n")
+    assert result.exit_code == 2
+    assert "--revision cannot be used together with --compare" in result.output
+
+
+def test_leaderboard_compare(renku_project, run_script):
+    """Test that only runs added or removed between two revisions are shown when comparing leaderboards."""
+    run_script(42, 0.8)
+    old_revision = run_script(123, 0.9)
+    new_revision = run_script(99, 0.95)
+
+    compare_rows = _compare_rows(old_revision, new_revision)
+    added = (_leaderboard_rows_at(new_revision).keys() - _leaderboard_rows_at(old_revision).keys()).pop()
+    assert list(compare_rows) == [added]
+    assert compare_rows[added][1:] == [
+        "added",
+        "xgboost.sklearn.XGBClassifier",
+        "['script.py']",
+        "- -> 1",
+        "-",
+        "0.95",
+        "+0.05",
+    ]
+
+    compare_rows = _compare_rows(new_revision, old_revision)
+    assert list(compare_rows) == [added]
+    assert compare_rows[added][1:] == [
+        "removed",
+        "xgboost.sklearn.XGBClassifier",
+        "['script.py']",
+        "1 -> -",
+        "0.95",
+        "-",
+        "-",
+    ]
+
+
+def test_leaderboard_compare_diverged(renku_project, run_script, run_shell):
+    """Test comparing the leaderboards of two diverged branches."""
+    run_script(42, 0.8)
+    branch = run_shell("git rev-parse --abbrev-ref HEAD", work_dir=renku_project)[0].decode().strip()
+
+    run_shell("git checkout -q -b feature", work_dir=renku_project)
+    feature = run_script(123, 0.95)
+    run_shell(f"git checkout -q {branch}", work_dir=renku_project)
+    main = run_script(99, 0.85)
+
+    feature_rows = _leaderboard_rows_at(feature)
+    main_rows = _leaderboard_rows_at(main)
+    assert len(feature_rows) == 2
+    assert len(main_rows) == 2
+    added = (feature_rows.keys() - main_rows.keys()).pop()
+    removed = (main_rows.keys() - feature_rows.keys()).pop()
+
+    compare_rows = _compare_rows(main, feature)
+    assert list(compare_rows) == [added, removed]
+    assert compare_rows[added][1:] == [
+        "added",
+        "xgboost.sklearn.XGBClassifier",
+        "['script.py']",
+        "- -> 1",
+        "-",
+        "0.95",
+        "+0.1",
+    ]
+    assert compare_rows[removed][1:] == [
+        "removed",
+        "xgboost.sklearn.XGBClassifier",
+        "['script.py']",
+        "1 -> -",
+        "0.85",
+        "-",
+        "-",
+    ]
+
+
+def test_leaderboard_delta():
+    """Test rank changes and metric deltas between two leaderboards."""
+    old_runs = {
+        "unchanged": {"accuracy": 0.9, "model": "a", "inputs": ["x"]},
+        "removed": {"accuracy": 0.7, "model": "a", "inputs": ["x"]},
+    }
+    new_runs = {
+        "unchanged": {"accuracy": 0.9, "model": "a", "inputs": ["x"]},
+        "added": {"accuracy": 0.95, "model": "b", "inputs": ["y"]},
+    }
+
+    delta = {d["run_id"]: d for d in _leaderboard_delta(old_runs, new_runs, "accuracy")}
+
+    assert list(delta) == ["added", "removed"]
+    assert (delta["added"]["status"], delta["added"]["old_rank"], delta["added"]["new_rank"]) == ("added", None, 1)
+    assert (delta["added"]["old_value"], delta["added"]["new_value"]) == (None, 0.95)
+    assert delta["added"]["delta"] == pytest.approx(0.05)
+    assert (delta["removed"]["status"], delta["removed"]["old_rank"]) == ("removed", 2)
+    assert delta["removed"]["new_rank"] is None
+    assert (delta["removed"]["old_value"], delta["removed"]["new_value"]) == (0.7, None)
+    assert delta["removed"]["delta"] is None
+
+
 def test_parameters(project_with_script, run_shell):
     """Test that a model parameters can be shown for several runs."""
     script_file, write_script = project_with_script